@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timetable.py')
+
+# Run the script with some optional modules hidden so every reader is covered
+RUNNER = """
+import sys, runpy
+for m in sys.argv[2].split(','):
+    if m:
+        sys.modules[m] = None
+sys.argv = [sys.argv[1], sys.argv[3]]
+runpy.run_path(sys.argv[0], run_name='__main__')
+"""
+
+READERS = {
+    'pyarrow': '',
+    'pandas': 'pyarrow',
+    'csv': 'pyarrow,pandas',
+}
+
+TASKS = [
+    'taskdebug,1,10,20,0,;file.c;foo;10;5;;40',
+    'taskdebug,2,15,30,0,;file.c;bar;20;5;;40',
+    'taskdebug,1,25,40,0,;file.c;foo;0;0;;50',
+]
+
+
+def run_timetable(tmp_path, reader, lines):
+    trace = tmp_path / 'debug.txt'
+    trace.write_text('\n'.join(lines) + '\n')
+    env = dict(os.environ, MPLBACKEND='Agg')
+    result = subprocess.run(
+        [sys.executable, '-c', RUNNER, SCRIPT, READERS[reader], str(trace)],
+        capture_output=True, text=True, env=env, cwd=tmp_path
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+@pytest.mark.parametrize('reader', READERS)
+def test_wide_first_line(tmp_path, reader):
+    out = run_timetable(tmp_path, reader, ['info,a,b,c,d,e,f'] + TASKS)
+    assert out.splitlines()[0] == '3'
+
+
+@pytest.mark.parametrize('reader', READERS)
+def test_wide_task_rows(tmp_path, reader):
+    out = run_timetable(tmp_path, reader, ['info,startup'] + [t + ',extra' for t in TASKS] + TASKS)
+    assert out.splitlines()[0] == '6'
+
+
+@pytest.mark.parametrize('reader', READERS)
+def test_no_task_rows(tmp_path, reader):
+    out = run_timetable(tmp_path, reader, ['other,abc,def', 'info,1,2,3,4,5'])
+    assert out.splitlines()[0] == '0'
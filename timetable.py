@@ -1,10 +1,23 @@
 # Importing the matplotlib.pyplot
 import matplotlib.pyplot as plt
-import csv
+import matplotlib.cm as cm
 import matplotlib.colors as mcolors
 import matplotlib.patches as mpatches
-import itertools
+import matplotlib.collections as mcollections
 import numpy as np
+import csv
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pv
+except ImportError:
+    pa = None
 
 import sys
 
@@ -14,27 +27,150 @@ if len(sys.argv) < 2:
 
 filename = sys.argv[1]
 
-datapoints = []
-names = set()
-count = 0
-
-with open(filename, 'r') as csvfile:
-    datareader = csv.reader(csvfile)
-    for row in datareader:
-        count += 1
-        if len(row) > 0 and row[0] == 'taskdebug':
-            datapoints.append((int(row[1]), int(row[2]), int(row[3]), row[5]))
-            names.add(row[5])
-
-print(len(datapoints))
-datapoints.sort(key=lambda x: (x[0], x[3]))
-names = list(names)
-names.sort()
-groups = [((i, name), list(group)) for ((i, name), group) in itertools.groupby(datapoints, lambda x: (x[0], x[3]))]
-
-# print(datapoints)
+column_names = ['tag', 'gtid', 'start', 'end', 'extra', 'name']
+
+if pa is not None:
+    # Keep the trace as Arrow columns until it is plotted. Arrow only reads
+    # rows of a fixed width, so rows with extra fields are set aside and
+    # parsed below. Rows with fewer than six fields can't be task records.
+    wide_rows = []
+    def skip_row(row):
+        if row.actual_columns > len(column_names):
+            wide_rows.append(row.text)
+        return 'skip'
+
+    table = pv.read_csv(
+        filename,
+        read_options=pv.ReadOptions(column_names=column_names),
+        parse_options=pv.ParseOptions(invalid_row_handler=skip_row),
+        convert_options=pv.ConvertOptions(
+            include_columns=['tag', 'gtid', 'start', 'end', 'name'],
+            column_types={c: pa.string() for c in column_names}
+        )
+    )
+    table = table.filter(pc.equal(table['tag'], 'taskdebug'))
+    table = pa.table({
+        'gtid': pc.cast(table['gtid'], pa.int64()),
+        'start': pc.cast(table['start'], pa.int64()),
+        'end': pc.cast(table['end'], pa.int64()),
+        'name': table['name']
+    })
+
+    gtid = table['gtid'].to_numpy()
+    start = table['start'].to_numpy()
+    end = table['end'].to_numpy()
+    name = table['name'].to_numpy()
+    del table
+
+    wide = np.array(
+        [row[:6] for row in csv.reader(wide_rows) if row[0] == 'taskdebug'],
+        dtype=object
+    ).reshape(-1, 6)
+    gtid = np.concatenate((gtid, wide[:, 1].astype(np.int64)))
+    start = np.concatenate((start, wide[:, 2].astype(np.int64)))
+    end = np.concatenate((end, wide[:, 3].astype(np.int64)))
+    name = np.concatenate((name, wide[:, 5]))
+    del wide_rows, wide
+elif pd is not None:
+    # Parse the whole trace in one go with pandas' C tokenizer. It has to know
+    # the widest row up front, or wider rows get dropped, so take an upper
+    # bound from the number of commas on each line.
+    with open(filename, 'rb') as f:
+        width = max((line.count(b',') + 1 for line in f), default=0)
+
+    df = pd.read_csv(
+        filename,
+        header=None,
+        names=range(max(width, len(column_names))),
+        usecols=[0, 1, 2, 3, 5],
+        # Only a handful of distinct tags exist, so as a category the filter
+        # below compares small integer codes rather than strings
+        dtype={0: 'category', 1: str, 2: str, 3: str, 5: str},
+        engine='c',
+        on_bad_lines='skip'
+    )
+    df.columns = ['tag', 'gtid', 'start', 'end', 'name']
+    # Task records have at least six fields, the sixth being the name
+    df = df[(df['tag'] == 'taskdebug') & df['name'].notna()]
+
+    gtid = df['gtid'].to_numpy().astype(np.int64)
+    start = df['start'].to_numpy().astype(np.int64)
+    end = df['end'].to_numpy().astype(np.int64)
+    name = df['name'].to_numpy(dtype=object)
+    del df
+else:
+    # Plain csv module fallback. Count the lines first so the columns can be
+    # allocated up front and the loop only fills in slots. The numbers are
+    # kept as strings and converted all at once after the loop.
+    with open(filename, 'rb') as f:
+        n = sum(1 for _ in f)
+
+    gtid = np.empty(n, dtype=object)
+    start = np.empty(n, dtype=object)
+    end = np.empty(n, dtype=object)
+    name = np.empty(n, dtype=object)
+
+    i = 0
+    with open(filename, 'r') as csvfile:
+        datareader = csv.reader(csvfile)
+        for row in datareader:
+            if len(row) > 0 and row[0] == 'taskdebug':
+                gtid[i] = row[1]
+                start[i] = row[2]
+                end[i] = row[3]
+                name[i] = row[5]
+                i += 1
+
+    gtid = gtid[:i].astype(np.int64)
+    start = start[:i].astype(np.int64)
+    end = end[:i].astype(np.int64)
+    name = name[:i]
+
+print(len(gtid))
+
+def factorize(values):
+    # Integer codes for values, numbered in order of the sorted uniques
+    if pd is not None:
+        return pd.factorize(values, sort=True)
+    uniques, codes = np.unique(values, return_inverse=True)
+    return codes, uniques
+
+# Pack the rows into one record array, with names replaced by an integer id,
+# so each row costs a few fixed-size fields instead of a tuple of objects.
+# The ids follow the sorted names, so they double as sort key and color index.
+name_id, names = factorize(name)
+datapoints = np.empty(len(gtid), dtype=[
+    ('gtid', 'i8'),
+    ('start', 'i8'),
+    ('end', 'i8'),
+    ('name_id', 'i4')
+])
+# Fill it in sorted order straight away rather than sorting a copy after
+order = np.lexsort((name_id, gtid))
+datapoints['gtid'] = gtid[order]
+datapoints['start'] = start[order]
+datapoints['end'] = end[order]
+datapoints['name_id'] = name_id[order]
+del gtid, start, end, name, order
+
+gtid = datapoints['gtid']
+start = datapoints['start']
+name_id = datapoints['name_id']
+width = datapoints['end'] - start
+
+# The rows are sorted, so every (gtid, name) pair is one contiguous run.
+# Encode the pair as a single integer and find where it changes.
+composite = gtid * len(names) + name_id
+is_first = np.ones(len(composite), dtype=bool)
+is_first[1:] = composite[1:] != composite[:-1]
+group_starts = np.flatnonzero(is_first)
+group_gtid = gtid[group_starts]
+group_name_id = name_id[group_starts]
+group_size = np.diff(np.append(group_starts, len(gtid)))
+
 # Declaring a figure "gnt"
-fig, gnt = plt.subplots()
+# The dpi is also the resolution the bars are rasterized at when saving
+fig, gnt = plt.subplots(dpi=150)
  
 # Setting Y-axis limits
 # gnt.set_ylim(0, 50)
@@ -46,7 +182,7 @@ fig, gnt = plt.subplots()
 gnt.set_xlabel('microseconds since start')
 gnt.set_ylabel('Gtid')
 
-gtids = list(set(map(lambda x: x[0][0], groups)))
+gtids = np.unique(gtid)
 
 # Setting ticks on y-axis
 gnt.set_yticks(list(map(lambda x: x+0.5, range(len(gtids)))))
@@ -54,62 +190,97 @@ gnt.set_yticks(list(map(lambda x: x+0.5, range(len(gtids)))))
 gnt.set_yticklabels(list(map(lambda x: str(x), gtids)))
 
 # We will color the bar depending on 3 factors, so we map them to RGB
-funcs = set()
-lines = set()
-ends = set()
-
-for n in names:
-    _blank, _file, func, line, _col, _blanc, end = n.split(sep=";")
-    funcs.add(func)
-    lines.add(int(line))
-    ends.add(int(end))
-
-funcs = sorted(list(funcs))
-lines = sorted(list(lines))
-ends = sorted(list(ends))
-def perc(a, aa):
-    if len(aa) == 1:
-        return 0.1
+if len(names) == 0:
+    fields = np.empty((0, 7), dtype=object)
+elif pd is not None:
+    fields = pd.Series(names).str.split(';', expand=True).to_numpy()
+else:
+    fields = np.array([n.split(';') for n in names], dtype=object)
+func_idx, funcs = factorize(fields[:, 2])
+line_idx, lines = factorize(fields[:, 3].astype(np.int64))
+end_idx, ends = factorize(fields[:, 6].astype(np.int64))
+
+def perc(idx, uniq):
+    if len(uniq) == 1:
+        return np.full(len(idx), 0.1)
     else:
-        return aa.index(a) / (len(aa) - 1)
+        return idx / (len(uniq) - 1)
 
 # Does nothine when 1
 scale_factor = 1
-def get_color(func, line, end):
-    r = perc(func, funcs)
-    g = perc(line, lines)
-    b = perc(end, ends)
-
-    addi = 0.5 - (0.5/scale_factor)
-
-    r = (r / scale_factor) + addi
-    g = (g / scale_factor) + addi
-    b = (b / scale_factor) + addi
-    return [r, g, b, 1.0]
-
-mapping = {}
-for n in names:
-    _blank, _file, func, line, col, _blanc, end = n.split(sep=";")
-    if line == '0' and col == '0':
-        mapping[n] = np.random.rand(3,)
-    else:
-        mapping[n] = get_color(func, int(line), int(end))
-
-
-for i, ((gtid, name), group) in enumerate(groups):
-    print(i, gtid, name)
-    gnt.broken_barh(
-        list(map(lambda x: (x[1], x[2] - x[1]), group)),
-        (gtids.index(gtid) + (names.index(name) / (len(names)*4)), 0.75),
-        facecolors=list(map(lambda x: mapping[x[3]], group)),
-        alpha=0.5,
-        edgecolor='black',
-        linewidth=0.2
-    )
+inv_scale = 1.0 / scale_factor
+addi = 0.5 - (0.5/scale_factor)
+def get_colors(func_idx, line_idx, end_idx):
+    r = perc(func_idx, funcs) * inv_scale + addi
+    g = perc(line_idx, lines) * inv_scale + addi
+    b = perc(end_idx, ends) * inv_scale + addi
+    return np.column_stack((r, g, b, np.ones(len(r))))
+
+name_colors = get_colors(func_idx, line_idx, end_idx)
+
+# Names without a source location get a random color instead. They are
+# drawn in one block from a fixed seed so the plot is reproducible.
+unlocated = (fields[:, 3] == '0') & (fields[:, 4] == '0')
+rng = np.random.default_rng(0)
+name_colors[unlocated, :3] = rng.random((np.count_nonzero(unlocated), 3))
+mapping = dict(zip(names, name_colors))
+
+# Draw every bar as one collection rather than one artist per group
+group_row = np.searchsorted(gtids, group_gtid)
+group_y = group_row + group_name_id / (len(names)*4)
+x0 = start
+x1 = start + width
+y0 = np.repeat(group_y, group_size)
+y1 = y0 + 0.75
+bars = mcollections.PolyCollection(
+    np.stack((
+        np.column_stack((x0, y0)),
+        np.column_stack((x0, y1)),
+        np.column_stack((x1, y1)),
+        np.column_stack((x1, y0))
+    ), axis=1),
+    facecolors=name_colors[name_id],
+    alpha=0.5,
+    edgecolor='black',
+    linewidth=0.2,
+    # Thousands of tiny rectangles bloat vector output (pdf, svg), so the
+    # bars are embedded as an image there instead
+    rasterized=True
+)
+gnt.add_collection(bars)
+gnt.autoscale_view()
+
+# A legend with a patch per name is unreadable (and slow to lay out) for
+# large traces, so fall back to one colorbar per color channel there
+LEGEND_MAX = 40
+if len(mapping) <= LEGEND_MAX:
+    legend_data = []
+    for x, y in mapping.items():
+        legend_data.append(mpatches.Patch(color=y, label=x))
+    gnt.legend(handles=legend_data)
+else:
+    for channel, (label, uniq) in enumerate((('func', funcs), ('line', lines), ('end', ends))):
+        # One color per factor value, built exactly like the bar colors
+        channel_colors = np.zeros((len(uniq), 3))
+        channel_colors[:, channel] = perc(np.arange(len(uniq)), uniq) * inv_scale + addi
+        sm = cm.ScalarMappable(
+            norm=mcolors.Normalize(-0.5, len(uniq) - 0.5),
+            cmap=mcolors.ListedColormap(channel_colors)
+        )
+        cbar = fig.colorbar(sm, ax=gnt, label=label)
+        if len(uniq) <= LEGEND_MAX:
+            cbar.set_ticks(range(len(uniq)), labels=list(map(str, uniq)))
 
-legend_data = []
-for x, y in mapping.items():
-    legend_data.append(mpatches.Patch(color=y, label=x))
-gnt.legend(handles=legend_data)
+    # Names without a source location have random colors that the colorbars
+    # don't describe, so list those in the legend instead
+    unlocated_names = names[unlocated]
+    if 0 < len(unlocated_names) <= LEGEND_MAX:
+        gnt.legend(handles=[mpatches.Patch(color=mapping[n], label=n) for n in unlocated_names])
+    elif len(unlocated_names) > LEGEND_MAX:
+        gnt.legend(handles=[mpatches.Patch(
+            facecolor='none',
+            edgecolor='black',
+            label='%d names without a source location (random colors)' % len(unlocated_names)
+        )])
 
 plt.show()
\ No newline at end of file